@@ -1,11 +1,13 @@
 import json
 from pathlib import Path
 from threading import Lock
-import time
 from flask import Flask, request, render_template, jsonify, Response, stream_with_context
+import convert as conversion
 from convert import convert_images
-from enums import OutputImageFormat
-from convert import global_conversion_progress
+from enums import OutputImageFormat, ImageBackend
+from constants import DEFAULT_METHOD, DEFAULT_BACKEND, PROGRESS_STREAM_TIMEOUT
+from logging_config import setup_logging
+from convert import global_conversion_progress, global_conversion_progress_updated
 
 app = Flask(__name__)
 conversion_lock = Lock()
@@ -17,9 +19,17 @@ def index():
 @app.route('/progress')
 def progress_stream():
     def generate():
+        sent_version = None
         while True:
-            yield f"data: {json.dumps(global_conversion_progress)}\n\n"
-            time.sleep(1) 
+            with global_conversion_progress_updated:
+                # Sleep until there is progress that has not been sent yet, resending the current state now and then.
+                # Comparing versions catches updates made while the previous message was being sent
+                global_conversion_progress_updated.wait_for(
+                    lambda: conversion.global_conversion_progress_version != sent_version, timeout=PROGRESS_STREAM_TIMEOUT)
+                sent_version = conversion.global_conversion_progress_version
+                # Serialize while holding the lock, so the conversion cannot change the progress halfway through
+                progress = json.dumps(global_conversion_progress)
+            yield f"data: {progress}\n\n"
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
 @app.route('/convert', methods=['POST'])
@@ -30,19 +40,25 @@ def convert():
             source_folder = request.form['source_folder']
             quality = request.form.get('quality', '80')
             threads = request.form.get('threads', '16')
+            method = request.form.get('method', str(DEFAULT_METHOD))
+            backend = request.form.get('backend', DEFAULT_BACKEND)
 
             # Validate and convert data types
-            if not quality.isdigit() or not threads.isdigit():
-                raise ValueError("Quality and threads should be numeric values")
+            if not quality.isdigit() or not threads.isdigit() or not method.isdigit():
+                raise ValueError("Quality, threads and method should be numeric values")
             
             quality = int(quality)
             threads = int(threads)
+            method = int(method)
+            backend = ImageBackend(backend.lower())
 
             # Validate input ranges
             if not (0 <= quality <= 100):
                 return "Quality must be between 0 and 100", 400
             if threads < 1:
                 return "Threads must be at least 1", 400
+            if not (0 <= method <= 6):
+                return "Method must be between 0 and 6", 400
 
             # Convert Path strings to Path objects
             source_folder_path = Path(source_folder)
@@ -50,7 +66,7 @@ def convert():
                 return "Source folder is not valid", 400
 
             # Call your conversion function
-            convert_images(source_folder_path, quality, threads, OutputImageFormat.WEBP)
+            convert_images(source_folder_path, quality, threads, OutputImageFormat.WEBP, method=method, backend=backend)
             return "Conversion completed", 200
         except KeyError as e:
             # Handle missing form fields
@@ -70,4 +86,5 @@ def convert():
         return jsonify({"message": message}), status_code
 
 if __name__ == '__main__':
+    setup_logging()  # Not on import, worker processes import this module as their main module
     app.run(debug=True)  # Set debug=False in a production environment
@@ -3,4 +3,23 @@ import os
 
 DEFAULT_QUALITY = 80
 DEFAULT_THREADS = os.cpu_count()
-DEFAULT_FORMAT = 'WEBP'
\ No newline at end of file
+DEFAULT_FORMAT = 'WEBP'
+# WEBP encoder effort from 0 (fastest) to 6 (smallest files)
+DEFAULT_METHOD = 0
+# Image library used for the conversion, one of pillow, vips or cv2
+DEFAULT_BACKEND = 'pillow'
+
+# Output formats that can store an alpha channel
+ALPHA_FORMATS = frozenset({'WEBP'})
+
+# Files up to this size in bytes are read into memory in one go before decoding
+IN_MEMORY_READ_LIMIT = 128 * 1024 * 1024
+
+# Number of files handed to a worker at a time, smaller batches balance the load better
+FILES_PER_BATCH = 16
+
+# Number of batches queued per worker, files are discovered only as fast as these are converted
+PENDING_BATCHES_PER_WORKER = 2
+
+# Seconds the progress stream waits for an update before resending the current progress
+PROGRESS_STREAM_TIMEOUT = 5
\ No newline at end of file
@@ -1,102 +1,202 @@
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from functools import partial
-from typing import List
+from itertools import chain, islice
+from typing import Iterable, Iterator, List, Optional, Tuple
 from tqdm import tqdm
 from time import time
 from pathlib import Path
+from threading import Condition
 from enum import Enum
-from constants import DEFAULT_QUALITY, DEFAULT_THREADS
-from enums import OutputImageFormat
-from logging_config import setup_logging
+from constants import DEFAULT_QUALITY, DEFAULT_THREADS, DEFAULT_METHOD, FILES_PER_BATCH, PENDING_BATCHES_PER_WORKER
+from enums import OutputImageFormat, ImageBackend
+from logging_config import setup_logging, start_log_listener, setup_worker_logging
 from utils import (
     get_user_settings,
     print_separator,
-    process_file,
+    check_image_backend,
+    output_path_resolver,
+    folder_prefixes,
+    convert_file,
+    resolve_backend,
     get_image_files,
     create_output_folder,
     generate_report,
-    OperationCancelledError
+    OperationCancelledError,
+    Stats
 )
 
 # Create a logger for this module
 logger = logging.getLogger(__name__)
 
-def worker(batch_of_files: List[Path], source_folder: Path, output_folder: Path, quality: int, format: Enum):
+# Start workers in fresh processes, forking while other threads (the log listener, Flask's request threads) hold locks can deadlock
+MP_CONTEXT = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+def worker(batch_of_files: List[str], source_folder: str, output_folder: str, quality: int, format: Enum,
+           max_dim: Optional[int] = None, method: int = DEFAULT_METHOD,
+           backend: ImageBackend = ImageBackend.PILLOW) -> Tuple[int, int, int]:
     """
     Process a batch of files and log any errors.
-    :param batch_of_files: List of Paths of the files to be processed.
+    :param batch_of_files: Paths of the files to be processed.
     :param source_folder: Source folder path.
     :param output_folder: Output folder path.
     :param quality: Quality for the conversion.
     :param format: Format to convert the image to.
+    :param max_dim: Optional cap on the width and height of the converted images.
+    :param method: WEBP encoder effort, lower is faster.
+    :param backend: Image library used to decode and encode the images.
+    :return: A tuple containing the total original size, total converted size and number of files converted.
     """
-    batch_stats = {'total_original_size': 0, 'total_converted_size': 0, 'conversion_count': 0}
+    total_original_size = total_converted_size = conversion_count = 0
+    resolve_output_file = output_path_resolver(source_folder, output_folder, format.value)
     for file_path in batch_of_files:
         try:
-            original_size, converted_size, files_converted = process_file(file_path, source_folder, output_folder, quality, format.value)
-            batch_stats = update_conversion_stats(batch_stats, original_size, converted_size, files_converted)
+            output_file_path = resolve_output_file(file_path)
+            original_size, converted_size, files_converted = convert_file(file_path, output_file_path, quality, format.value, max_dim, method, backend)
+            total_original_size += original_size
+            total_converted_size += converted_size
+            conversion_count += files_converted
         except OperationCancelledError as e:
             logger.error(f"Operation cancelled while processing {file_path}: {e}")
         except Exception as e:
             logger.error(f"Error processing {file_path}: {e}")
-    return batch_stats
+    return (total_original_size, total_converted_size, conversion_count)
 
-def update_conversion_stats(stats, original_size, converted_size, files_converted):
+def batch_files(files: Iterable[str], batch_size: int) -> Iterator[List[str]]:
     """
-    Update conversion stats after processing each file.
-    :param stats: Conversion stats dictionary.
-    :param original_size: Original size of the processed file.
-    :param converted_size: Converted size of the processed file.
-    :param files_converted: Number of files successfully converted.
+    Lazily split the files into batches of at most batch_size files.
+    :param files: Paths of the files to be processed.
+    :param batch_size: Maximum number of files per batch.
     """
-    stats['total_original_size'] += original_size
-    stats['total_converted_size'] += converted_size
-    stats['conversion_count'] += files_converted
-    return stats
+    iterator = iter(files)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
 
 global_conversion_progress = {}
+# Guards global_conversion_progress, and is notified whenever it changes
+global_conversion_progress_updated = Condition()
+# Bumped with every update, so waiters can tell whether they missed one while not waiting
+global_conversion_progress_version = 0
+
+def update_progress(**changes):
+    """
+    Apply changes to the global conversion progress while holding its lock,
+    and wake up everything waiting for them, like the web UI's progress stream.
+    """
+    global global_conversion_progress_version
+    with global_conversion_progress_updated:
+        global_conversion_progress.update(changes)
+        global_conversion_progress_version += 1
+        global_conversion_progress_updated.notify_all()
+
+def track_discovered_files(files: Iterable[str], source_folder: str, output_folder: str) -> Iterator[str]:
+    """
+    Pass the files through while counting them in the global conversion progress.
+    Each output subfolder is created once, before the first file inside it reaches a worker.
+    Files sharing a name but not a suffix, like a.jpg and a.png, would be converted to the same output file,
+    so only the first one listed is kept and the others are skipped with a warning.
+    :param files: Paths of the files to be processed.
+    :param source_folder: Source folder path.
+    :param output_folder: Output folder path.
+    """
+    source_prefix_len, output_prefix = folder_prefixes(source_folder, output_folder)
+    current_folder = None
+    kept_files = {}
+    for file_path in files:
+        folder, file_name = os.path.split(file_path)
+        # get_image_files yields the files of a folder together, so each folder is only seen once
+        if folder != current_folder:
+            os.makedirs(output_prefix + folder[source_prefix_len:], exist_ok=True)
+            current_folder = folder
+            kept_files = {}
+        stem = file_name.rpartition(".")[0]
+        if stem in kept_files:
+            logger.warning(f"Skipping {file_path}, it would overwrite the converted {kept_files[stem]}")
+            continue
+        kept_files[stem] = file_path
+        with global_conversion_progress_updated:
+            global_conversion_progress['num_files'] += 1
+        yield file_path
 
 def convert_images(source_folder_path: Path, quality: int = DEFAULT_QUALITY, threads: int = DEFAULT_THREADS,
-                   format: Enum = OutputImageFormat.WEBP):
+                   format: Enum = OutputImageFormat.WEBP, max_dim: Optional[int] = None, method: int = DEFAULT_METHOD,
+                   backend: ImageBackend = ImageBackend.PILLOW):
     """
     Convert images in the source folder to the specified format.
     :param source_folder_path: Source folder path containing the images.
     :param quality: Quality for the conversion.
-    :param threads: Number of threads to be used for the conversion.
+    :param threads: Number of worker processes to be used for the conversion.
     :param format: Format to convert the images to.
+    :param max_dim: Optional cap on the width and height of the converted images.
+    :param method: WEBP encoder effort, lower is faster.
+    :param backend: Image library used to decode and encode the images, Pillow is used if it is not installed.
     """
-    conversion_stats = {'total_original_size': 0, 'total_converted_size': 0, 'conversion_count': 0}
-    global global_conversion_progress
+    total_original_size = total_converted_size = conversion_count = 0
+    with global_conversion_progress_updated:
+        global_conversion_progress.clear()
+    update_progress(num_files=0, done=False)
 
-    file_list = get_image_files(source_folder_path)
-    global_conversion_progress['num_files'] = len(file_list)
+    # Files are discovered while the conversion runs, peek at the first one to catch empty folders
+    image_files = get_image_files(source_folder_path)
+    first_file = next(image_files, None)
 
-    if not file_list:
+    if first_file is None:
         logger.info("No image files found in the source folder.")
+        update_progress(done=True)
         return
 
     try:
-        output_folder = create_output_folder(source_folder_path, format.value)
+        output_folder = str(create_output_folder(source_folder_path, format.value))
     except OperationCancelledError as e:
         logger.error(str(e))
+        update_progress(done=True)
         return
     
     logger.info("*** Starting a new conversion process... ***")
 
     start_time = time()
+    backend = resolve_backend(backend)
+    # Workers build paths with plain string operations, which is cheaper than creating Path objects per file
+    source_folder = str(source_folder_path)
 
-    # Create batches of file paths
-    batch_size = len(file_list) // (threads * 32)
-    batches_of_files = [file_list[i:i + batch_size] for i in range(0, len(file_list), batch_size)]
-
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        worker_partial = partial(worker, source_folder=source_folder_path, output_folder=output_folder, quality=quality,
-                                 format=format)
-        for batch_stats in tqdm(executor.map(worker_partial, batches_of_files), total=len(batches_of_files), unit="batch"):
-            conversion_stats = update_conversion_stats(conversion_stats, batch_stats['total_original_size'], batch_stats['total_converted_size'], batch_stats['conversion_count'])
-            global_conversion_progress['stats'] = conversion_stats
-    conversion_stats['total_time'] = time() - start_time
+    batches_of_files = batch_files(track_discovered_files(chain([first_file], image_files), source_folder, output_folder), FILES_PER_BATCH)
+
+    # Workers send their log records to this process instead of writing them themselves
+    log_queue, log_listener = start_log_listener(MP_CONTEXT)
+    try:
+        # Use processes rather than threads so the conversions are not serialized by the GIL
+        with ProcessPoolExecutor(max_workers=threads, mp_context=MP_CONTEXT, initializer=setup_worker_logging,
+                                 initargs=(log_queue,)) as executor, tqdm(unit="file") as progress_bar:
+            worker_partial = partial(worker, source_folder=source_folder, output_folder=output_folder, quality=quality,
+                                     format=format, max_dim=max_dim, method=method,
+                                     backend=backend)
+            # Only keep a few batches per worker in flight, so the walk stays just ahead of the conversion
+            max_pending_batches = threads * PENDING_BATCHES_PER_WORKER
+            pending_batches = {}
+            while True:
+                for batch in islice(batches_of_files, max_pending_batches - len(pending_batches)):
+                    pending_batches[executor.submit(worker_partial, batch)] = len(batch)
+                progress_bar.total = global_conversion_progress['num_files']
+                if not pending_batches:
+                    break
+                done_batches, _ = wait(pending_batches, return_when=FIRST_COMPLETED)
+                for future in done_batches:
+                    batch_original_size, batch_converted_size, batch_count = future.result()
+                    total_original_size += batch_original_size
+                    total_converted_size += batch_converted_size
+                    conversion_count += batch_count
+                    progress_bar.update(pending_batches.pop(future))
+                update_progress(stats={'total_original_size': total_original_size,
+                                       'total_converted_size': total_converted_size,
+                                       'conversion_count': conversion_count})
+    finally:
+        log_listener.stop()
+        # Mark the conversion as done even when it fails, so progress streams do not wait for it forever
+        conversion_stats = Stats(total_original_size=total_original_size, total_converted_size=total_converted_size,
+                                 conversion_count=conversion_count, total_time=time() - start_time)
+        update_progress(stats=conversion_stats, done=True)
     generate_report(conversion_stats)
 
 def main():
@@ -105,9 +205,10 @@ def main():
     """
     print_separator()
     setup_logging()
-    source_folder, quality, threads = get_user_settings()
+    check_image_backend()
+    source_folder, quality, threads, method, backend = get_user_settings()
     image_format = OutputImageFormat.WEBP
-    convert_images(source_folder, quality, threads, image_format)
+    convert_images(source_folder, quality, threads, image_format, method=method, backend=backend)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,6 +4,12 @@ class OutputImageFormat(str, Enum):
     WEBP = 'WEBP'
     # add other formats as needed
 
+class ImageBackend(str, Enum):
+    """Enum representing the libraries that can decode and encode images."""
+    PILLOW = 'pillow'
+    VIPS = 'vips'
+    CV2 = 'cv2'
+
 class ImageFormat(Enum):
     """Enum representing supported image formats."""
     PNG = "png"
@@ -1,4 +1,8 @@
 import logging
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing.context import BaseContext
+from typing import Tuple
 
 # Define the log level, format, and the name of the log file
 LOG_LEVEL = logging.INFO
@@ -30,3 +34,29 @@ def setup_logging():
     # Add the handlers to the logger
     logger.addHandler(console_handler)
     logger.addHandler(file_handler)
+
+def start_log_listener(mp_context: BaseContext) -> Tuple[multiprocessing.Queue, QueueListener]:
+    """
+    Start a listener that writes the records logged by worker processes to the handlers of this process.
+    :param mp_context: Multiprocessing context the worker processes are started with.
+    :return: Tuple containing the queue to pass to setup_worker_logging and the started listener.
+    """
+    log_queue = mp_context.Queue()
+    # Without configured handlers, fall back to the handler logging itself uses then, so worker errors are not lost
+    handlers = logging.getLogger().handlers or [logging.lastResort]
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return log_queue, listener
+
+def setup_worker_logging(log_queue: multiprocessing.Queue):
+    """
+    Set up logging in a worker process so records are only pushed to the queue.
+    The main process does the formatting and I/O, so workers never wait on each other's log writes.
+    :param log_queue: Queue drained by the listener from start_log_listener.
+    """
+    logger = logging.getLogger()
+    # Drop any handlers set up while importing the main module, so nothing is written twice
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(LOG_LEVEL)
@@ -1,18 +1,42 @@
 import datetime
+import io
 import logging
+import os
 from pathlib import Path
 import shutil
-from typing import List, Tuple, TypedDict, Callable, Optional, Any
+from threading import Thread
+from typing import Iterator, Tuple, TypedDict, Callable, Optional, Any
 
-from PIL import Image, UnidentifiedImageError
+from PIL import Image, UnidentifiedImageError, features
 
-from enums import ImageFormat
+# Optional image backends, Pillow is used when they are not installed
+try:
+    import pyvips
+    logging.getLogger("pyvips").setLevel(logging.WARNING)  # libvips reports every operation at info level
+except (ImportError, OSError):
+    pyvips = None
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+from enums import ImageFormat, ImageBackend
 from exceptions import OperationCancelledError
-from constants import DEFAULT_QUALITY, DEFAULT_THREADS
+from constants import DEFAULT_QUALITY, DEFAULT_THREADS, DEFAULT_METHOD, DEFAULT_BACKEND, ALPHA_FORMATS, IN_MEMORY_READ_LIMIT
 
 # Create a logger for this module
 logger = logging.getLogger(__name__)
 
+# Errors that only affect the file being converted, including those raised by the optional backends
+FILE_ERRORS = (UnidentifiedImageError, PermissionError, FileNotFoundError, ValueError)
+if pyvips:
+    FILE_ERRORS += (pyvips.Error,)
+if cv2:
+    FILE_ERRORS += (cv2.error,)
+
+# Lowercase suffixes of the image files picked up for conversion
+IMAGE_SUFFIXES = frozenset(img_format.value for img_format in ImageFormat)
+
 class Stats(TypedDict):
     """TypedDict representing the structure for conversion statistics."""
     total_original_size: int
@@ -85,19 +109,35 @@ def get_user_input(prompt: str, validation_func: Callable[[Any], bool], conversi
         else:
             logger.error(error_message)  # Inform the user immediately
 
-def get_image_files(source_folder: Path) -> List[Path]:
+def get_image_files(source_folder: Path) -> Iterator[str]:
     """
-    Given a source folder, returns a list of all image files in the folder
-    and its subfolders based on valid image suffixes.
+    Given a source folder, yields all image files in the folder
+    and its subfolders based on valid image suffixes, in a single pass.
+    Paths are yielded as strings, which keeps the walk free of per-file Path objects.
     
     :param source_folder: The source folder path.
-    :return: A list of image file paths.
+    :return: An iterator of image file paths.
     """
-    image_files = []
-    patterns = [f"*.{img_format.value.lower()}" for img_format in ImageFormat]
-    for pattern in patterns:
-        image_files.extend(source_folder.rglob(pattern))
-    return image_files
+    pending_folders = [os.fspath(source_folder)]
+    while pending_folders:
+        folder = pending_folders.pop()
+        try:
+            entries = os.scandir(folder)
+        except OSError as e:
+            # Skip folders that cannot be listed, like os.walk does, instead of ending the whole conversion
+            logger.warning(f"Skipping folder {folder}: {e}")
+            continue
+        with entries:
+            sub_folders = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    sub_folders.append(entry.path)
+                    continue
+                _, dot, suffix = entry.name.rpartition(".")
+                if dot and suffix.lower() in IMAGE_SUFFIXES and entry.is_file():
+                    yield entry.path
+        # Visit subfolders in listing order, keeping the files of a folder together
+        pending_folders.extend(reversed(sub_folders))
 
 def create_output_folder(source_folder: Path, format: str) -> Path:
     """
@@ -115,40 +155,238 @@ def create_output_folder(source_folder: Path, format: str) -> Path:
         user_input = get_user_input_for_folder("Output folder already exists. Do you want to replace it? (y/n): ", {'y', 'n'})
         if user_input == 'n':
             raise OperationCancelledError("Operation cancelled by the user.")
-        shutil.rmtree(output_folder)
+        remove_folder_in_background(output_folder)
     output_folder.mkdir(parents=True, exist_ok=True)
     return output_folder
 
-def process_file(file_path: Path, source_folder: Path, output_folder: Path, quality: int, format: str) -> Tuple[int, int, int]:
+def remove_folder_in_background(folder: Path):
     """
-    Process each image file, convert it to the desired format and quality, 
-    and save it to the output folder.
+    Move a folder out of the way with a rename, which is instant on the same filesystem,
+    and delete it on a background thread so a large folder does not hold up the conversion.
+    
+    :param folder: The folder to be removed.
+    """
+    stale_folder = folder.with_name(f".{folder.name}_deleting_{os.getpid()}")
+    try:
+        os.rename(folder, stale_folder)
+    except OSError:
+        shutil.rmtree(folder)
+        return
+    Thread(target=shutil.rmtree, args=(stale_folder,), kwargs={'ignore_errors': True}).start()
+
+def prepare_image(img: Image.Image, format: str) -> Image.Image:
+    """
+    Convert the image to a mode the target format can store, avoiding a copy when it already fits.
+    
+    :param img: The opened source image.
+    :param format: The format of the converted image.
+    :return: The image itself, or a converted copy if its mode is not supported.
+    """
+    if format.upper() in ALPHA_FORMATS:
+        if img.mode in ("RGB", "RGBA"):
+            return img
+        if img.mode in ("LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+            return img.convert("RGBA")
+    elif img.mode == "RGB":
+        return img
+    return img.convert("RGB")
+
+def folder_prefixes(source_folder: str, output_folder: str) -> Tuple[int, str]:
+    """
+    Compute the string prefixes used to map a path in the source folder to the same path in the output folder.
+    
+    :param source_folder: The source folder path.
+    :param output_folder: The output folder path.
+    :return: A tuple containing the length of the source folder prefix, and the output folder prefix.
+    """
+    return len(os.path.join(source_folder, "")), os.path.join(output_folder, "")
+
+def output_path_resolver(source_folder: str, output_folder: str, format: str) -> Callable[[str], str]:
+    """
+    Build a function resolving the output path of files found by get_image_files in the source folder.
+    The folder prefixes are computed once, so resolving a file only slices strings and creates no Path objects.
     
-    :param file_path: The path of the file to be processed.
     :param source_folder: The source folder path.
     :param output_folder: The output folder path.
+    :param format: The format of the converted image.
+    :return: A function returning the output file path of an image file.
+    """
+    source_prefix_len, output_prefix = folder_prefixes(source_folder, output_folder)
+    output_suffix = f".{format.lower()}"
+
+    def resolve(file_path: str) -> str:
+        stem, _, _ = file_path[source_prefix_len:].rpartition(".")
+        return output_prefix + stem + output_suffix
+
+    return resolve
+
+def convert_file(file_path: str, output_file_path: str, quality: int, format: str,
+                 max_dim: Optional[int] = None, method: int = DEFAULT_METHOD,
+                 backend: ImageBackend = ImageBackend.PILLOW) -> Tuple[int, int, int]:
+    """
+    Decode an image file and encode it to an already resolved output path.
+    
+    :param file_path: The path of the file to be processed.
+    :param output_file_path: The path the converted image is written to.
     :param quality: The quality of the converted image.
     :param format: The format of the converted image.
+    :param max_dim: Optional cap on the width and height of the converted image.
+    :param method: The WEBP encoder effort, lower is faster.
+    :param backend: The image library used to decode and encode the image.
     :return: A tuple containing the original size, converted size, and count (1).
     """
-    output_file_path = output_folder / file_path.relative_to(source_folder).with_suffix(f".{format.lower()}")
-    output_file_path.parent.mkdir(parents=True, exist_ok=True)
-    original_size = file_path.stat().st_size
-
     try:
-        with Image.open(file_path) as img:
-            img.convert("RGB").save(output_file_path, format, quality=quality)  # Convert to RGB as some formats don't support RGBA
-    except (UnidentifiedImageError, PermissionError, FileNotFoundError) as error:
-        logger.error(f"Error processing file {file_path}. Error: {error}")
+        # Encode in memory so the converted size is known without another stat call
+        if backend == ImageBackend.PILLOW:
+            original_size, encoded = encode_with_pillow(file_path, quality, format, max_dim, method)
+        else:
+            # libvips and OpenCV open the file themselves, so its size is read here in the worker
+            original_size = os.path.getsize(file_path)
+            if backend == ImageBackend.VIPS:
+                encoded = encode_with_vips(file_path, quality, format, max_dim, method)
+            else:
+                encoded = encode_with_cv2(file_path, quality, format, max_dim)
+        # Write to a temporary file and rename it, so an interrupted run never leaves a truncated image behind
+        temp_file_path = f"{output_file_path}.tmp"
+        try:
+            with open(temp_file_path, "wb") as output_file:
+                output_file.write(encoded)
+            os.replace(temp_file_path, output_file_path)
+        except OSError:
+            # Remove the partly written temporary file before reporting the error
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            raise
+    except FILE_ERRORS as error:
+        # libvips errors span several lines, keep each error on a single log line
+        logger.error(f"Error processing file {file_path}. Error: {' '.join(str(error).split())}")
         return (0, 0, 0)
 
-    converted_size = output_file_path.stat().st_size
-    return (original_size, converted_size, 1)
+    return (original_size, encoded.nbytes, 1)
+
+def encode_with_pillow(file_path: str, quality: int, format: str, max_dim: Optional[int],
+                       method: int) -> Tuple[int, memoryview]:
+    """
+    Decode and encode an image with Pillow.
+    Files up to IN_MEMORY_READ_LIMIT are read in one go, so the decoder works on a buffer in memory
+    instead of issuing many small reads.
+    
+    :param file_path: The path of the file to be processed.
+    :param quality: The quality of the converted image.
+    :param format: The format of the converted image.
+    :param max_dim: Optional cap on the width and height of the converted image.
+    :param method: The WEBP encoder effort, lower is faster.
+    :return: A tuple containing the size of the file and the encoded image.
+    """
+    with open(file_path, "rb") as source_file:
+        file_size = os.fstat(source_file.fileno()).st_size
+        source = io.BytesIO(source_file.read()) if file_size <= IN_MEMORY_READ_LIMIT else source_file
+        try:
+            img = Image.open(source)
+        except UnidentifiedImageError:
+            # Name the file instead of the in-memory buffer it was read into
+            raise UnidentifiedImageError(f"cannot identify image file '{file_path}'") from None
+        with img:
+            if img.format == "JPEG":
+                # Let the decoder output RGB directly, using its fast scaled decode when downsizing
+                img.draft("RGB", (max_dim, max_dim) if max_dim else img.size)
+            if max_dim:
+                img.thumbnail((max_dim, max_dim), Image.Resampling.BILINEAR)
+            converted = prepare_image(img, format)
+            if converted is not img:
+                img.close()  # Free the decoded source before encoding to keep peak memory down
+            buffer = io.BytesIO()
+            with converted:
+                converted.save(buffer, format, quality=quality, method=method)
+    return file_size, buffer.getbuffer()
+
+def encode_with_vips(file_path: str, quality: int, format: str, max_dim: Optional[int], method: int) -> memoryview:
+    """
+    Decode and encode an image with libvips, which streams the image and encodes it on several threads.
+    
+    :param file_path: The path of the file to be processed.
+    :param quality: The quality of the converted image.
+    :param format: The format of the converted image.
+    :param max_dim: Optional cap on the width and height of the converted image.
+    :param method: The WEBP encoder effort, lower is faster.
+    :return: The encoded image.
+    """
+    if max_dim:
+        # thumbnail uses shrink-on-load, so large JPEGs are decoded at a reduced scale.
+        # Like the other backends, it leaves the EXIF orientation alone
+        img = pyvips.Image.thumbnail(file_path, max_dim, height=max_dim, size="down", no_rotate=True)
+    else:
+        img = pyvips.Image.new_from_file(file_path, access="sequential")
+    return memoryview(img.write_to_buffer(f".{format.lower()}", Q=quality, effort=method))
+
+def encode_with_cv2(file_path: str, quality: int, format: str, max_dim: Optional[int]) -> memoryview:
+    """
+    Decode and encode an image with OpenCV, which calls into the codecs with the GIL released.
+    
+    :param file_path: The path of the file to be processed.
+    :param quality: The quality of the converted image.
+    :param format: The format of the converted image.
+    :param max_dim: Optional cap on the width and height of the converted image.
+    :return: The encoded image.
+    """
+    # Like the other backends, leave the EXIF orientation alone
+    img = cv2.imread(file_path, cv2.IMREAD_UNCHANGED | cv2.IMREAD_IGNORE_ORIENTATION)
+    if img is None:
+        raise UnidentifiedImageError(f"cannot identify image file '{file_path}'")
+    if img.dtype != "uint8":
+        # Scale high bit depth images down to 8 bits in memory, keeping any alpha channel
+        img = cv2.convertScaleAbs(img, alpha=255 / 65535)
+    height, width = img.shape[:2]
+    if max_dim and max(height, width) > max_dim:
+        scale = max_dim / max(height, width)
+        img = cv2.resize(img, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+    # OpenCV treats a WEBP quality below 1 as lossless
+    success, encoded = cv2.imencode(f".{format.lower()}", img, [cv2.IMWRITE_WEBP_QUALITY, max(1, quality)])
+    if not success:
+        raise ValueError(f"OpenCV could not encode {file_path} as {format}")
+    return memoryview(encoded)
+
+def resolve_backend(backend: ImageBackend) -> ImageBackend:
+    """
+    Fall back to Pillow if the library of the requested backend is not installed.
+    
+    :param backend: The requested image backend.
+    :return: The image backend to use.
+    """
+    if (backend == ImageBackend.VIPS and pyvips is None) or (backend == ImageBackend.CV2 and cv2 is None):
+        logger.warning(f"The {backend.value} backend is not installed. Falling back to {ImageBackend.PILLOW.value}.")
+        return ImageBackend.PILLOW
+    return backend
+
+def check_image_backend():
+    """
+    Log a warning if the installed imaging stack is missing the SIMD accelerated paths.
+    Pillow-SIMD and a libjpeg-turbo backed JPEG decoder make a large difference on big batches.
+    """
+    if not features.check_feature("libjpeg_turbo"):
+        logger.warning("Pillow is not linked against libjpeg-turbo. JPEG decoding will be noticeably slower.")
+    if ".post" not in Image.__version__:
+        logger.info("Using stock Pillow. Install Pillow-SIMD for faster conversions (see README).")
+    if not _cpu_supports_avx2():
+        logger.warning("AVX2 is not available on this CPU. SIMD accelerated conversions will fall back to slower paths.")
+
+def _cpu_supports_avx2() -> bool:
+    """
+    Best effort check for AVX2 support. Returns True when the CPU flags cannot be read.
+    """
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith("flags"):
+                    return "avx2" in line.split()
+    except OSError:
+        pass
+    return True
 
 def get_user_settings():
     """
-    Get user settings like source folder, quality and number of threads.
-    :return: Tuple containing source folder, quality and number of threads.
+    Get user settings like source folder, quality, number of threads, encoder method and image backend.
+    :return: Tuple containing source folder, quality, number of threads, encoder method and image backend.
     """
     source_folder = get_user_input(
         "Enter the path to the source folder: ",
@@ -173,7 +411,23 @@ def get_user_settings():
         DEFAULT_THREADS
     )
 
-    return source_folder, quality, threads
+    method = get_user_input(
+        f"Enter the encoder method, 0 (fastest) to 6 (smallest) (default {DEFAULT_METHOD}): ",
+        lambda x: isinstance(x, int) and 0 <= x <= 6,
+        int,
+        "Invalid input. Please enter a number between 0 and 6.",
+        DEFAULT_METHOD
+    )
+
+    backend = get_user_input(
+        f"Enter the image backend, {'/'.join(b.value for b in ImageBackend)} (default {DEFAULT_BACKEND}): ",
+        lambda x: isinstance(x, ImageBackend),
+        lambda x: ImageBackend(x.lower()),
+        "Invalid input. Please enter one of the listed backends.",
+        ImageBackend(DEFAULT_BACKEND)
+    )
+
+    return source_folder, quality, threads, method, backend
 
 def generate_report(stats: Stats):
     """
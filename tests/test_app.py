@@ -0,0 +1,22 @@
+import json
+from time import monotonic
+
+import app
+from convert import update_progress
+
+
+def test_progress_stream_sends_updates_made_between_messages(monkeypatch):
+    monkeypatch.setattr(app, "PROGRESS_STREAM_TIMEOUT", 30)
+    update_progress(num_files=1, done=False)
+    response = app.app.test_client().get('/progress', buffered=False)
+    stream = iter(response.response)
+    try:
+        assert json.loads(next(stream).decode()[len("data: "):])['num_files'] == 1
+
+        # Reported before the stream waits again, which must not be missed until the timeout
+        update_progress(num_files=2)
+        started = monotonic()
+        assert json.loads(next(stream).decode()[len("data: "):])['num_files'] == 2
+        assert monotonic() - started < 5
+    finally:
+        response.close()
@@ -0,0 +1,80 @@
+import os
+from threading import Thread
+
+import pytest
+from PIL import Image
+
+import convert
+from convert import (batch_files, convert_images, global_conversion_progress, global_conversion_progress_updated,
+                     track_discovered_files, update_progress)
+from enums import OutputImageFormat
+
+
+def test_batch_files_splits_into_batches_of_at_most_batch_size():
+    files = [f"{i}.jpg" for i in range(5)]
+
+    assert list(batch_files(iter(files), 2)) == [files[0:2], files[2:4], files[4:5]]
+
+
+def test_convert_images_with_fewer_files_than_batches(tmp_path):
+    source_folder = tmp_path / "photos"
+    (source_folder / "nested").mkdir(parents=True)
+    Image.new("RGB", (32, 32), "red").save(source_folder / "a.jpg")
+    Image.new("RGBA", (32, 32), (0, 0, 255, 128)).save(source_folder / "b.png")
+    Image.new("L", (32, 32)).save(source_folder / "nested" / "c.JPEG")
+
+    convert_images(source_folder, threads=2, format=OutputImageFormat.WEBP)
+
+    output_folder, = (path for path in tmp_path.iterdir() if path != source_folder)
+    converted = sorted(path.relative_to(output_folder).as_posix() for path in output_folder.rglob("*.webp"))
+    assert converted == ["a.webp", "b.webp", "nested/c.webp"]
+    assert global_conversion_progress['done']
+    assert global_conversion_progress['num_files'] == 3
+    assert global_conversion_progress['stats']['conversion_count'] == 3
+
+
+def test_convert_images_marks_progress_done_when_the_conversion_fails(tmp_path, monkeypatch):
+    source_folder = tmp_path / "photos"
+    source_folder.mkdir()
+    Image.new("RGB", (32, 32), "red").save(source_folder / "a.jpg")
+
+    def failing_batch_files(files, batch_size):
+        raise OSError("disk full")
+        yield
+    monkeypatch.setattr(convert, "batch_files", failing_batch_files)
+
+    with pytest.raises(OSError):
+        convert_images(source_folder, threads=1, format=OutputImageFormat.WEBP)
+
+    assert global_conversion_progress['done']
+
+
+def test_track_discovered_files_skips_files_converting_to_the_same_output(tmp_path):
+    source_folder = str(tmp_path / "photos")
+    output_folder = str(tmp_path / "photos_webp")
+    files = [os.path.join(source_folder, name) for name in ("a.jpg", "a.png", "b.png", os.path.join("nested", "a.png"))]
+    update_progress(num_files=0)
+
+    kept = list(track_discovered_files(files, source_folder, output_folder))
+
+    assert kept == [files[0], files[2], files[3]]
+    assert global_conversion_progress['num_files'] == 3
+    assert os.path.isdir(os.path.join(output_folder, "nested"))
+
+
+def test_update_progress_bumps_the_version_and_wakes_up_waiters():
+    version = convert.global_conversion_progress_version
+    woken = []
+
+    def wait_for_update():
+        with global_conversion_progress_updated:
+            woken.append(global_conversion_progress_updated.wait_for(
+                lambda: convert.global_conversion_progress_version != version, timeout=5))
+    waiter = Thread(target=wait_for_update)
+    waiter.start()
+    update_progress(num_files=7)
+    waiter.join()
+
+    assert woken == [True]
+    assert convert.global_conversion_progress_version == version + 1
+    assert global_conversion_progress['num_files'] == 7
@@ -0,0 +1,15 @@
+import logging
+import multiprocessing
+
+from logging_config import start_log_listener
+
+
+def test_start_log_listener_falls_back_to_last_resort_without_handlers(monkeypatch):
+    monkeypatch.setattr(logging.getLogger(), "handlers", [])
+
+    log_queue, listener = start_log_listener(multiprocessing.get_context("spawn"))
+    try:
+        assert listener.handlers == (logging.lastResort,)
+    finally:
+        listener.stop()
+        log_queue.close()
@@ -0,0 +1,189 @@
+import os
+
+import pytest
+from PIL import Image, UnidentifiedImageError
+
+import utils
+from enums import ImageBackend
+from utils import (convert_file, encode_with_pillow, get_image_files, output_path_resolver, prepare_image,
+                   remove_folder_in_background, resolve_backend)
+
+
+@pytest.mark.parametrize("mode, info, expected_mode", [
+    ("RGB", {}, "RGB"),
+    ("RGBA", {}, "RGBA"),
+    ("P", {"transparency": 0}, "RGBA"),
+    ("P", {}, "RGB"),
+    ("L", {}, "RGB"),
+])
+def test_prepare_image_converts_to_a_webp_mode(mode, info, expected_mode):
+    img = Image.new(mode, (4, 4))
+    img.info.update(info)
+
+    prepared = prepare_image(img, "WEBP")
+
+    assert prepared.mode == expected_mode
+    if mode == expected_mode:
+        assert prepared is img  # No copy when the mode already fits
+
+
+@pytest.mark.parametrize("name, size", [("wide.jpg", (400, 200)), ("tall.png", (150, 300))])
+def test_convert_file_caps_the_larger_side_at_max_dim(tmp_path, name, size):
+    file_path = str(tmp_path / name)
+    Image.new("RGB", size, "green").save(file_path)
+    output_file_path = str(tmp_path / "out.webp")
+
+    convert_file(file_path, output_file_path, 80, "WEBP", max_dim=100)
+
+    with Image.open(output_file_path) as converted:
+        assert max(converted.size) == 100
+        assert converted.size[0] / converted.size[1] == pytest.approx(size[0] / size[1], rel=0.05)
+
+
+def test_convert_file_does_not_upscale_small_images(tmp_path):
+    file_path = str(tmp_path / "small.jpg")
+    Image.new("RGB", (40, 20), "green").save(file_path)
+    output_file_path = str(tmp_path / "out.webp")
+
+    convert_file(file_path, output_file_path, 80, "WEBP", max_dim=100)
+
+    with Image.open(output_file_path) as converted:
+        assert converted.size == (40, 20)
+
+
+def test_get_image_files_matches_suffixes_case_insensitively(tmp_path):
+    (tmp_path / "nested").mkdir()
+    for name in ("a.JPG", "b.Png", "c.jpeg", "nested/d.JPEG", "e.webp", "png", "notes.txt"):
+        (tmp_path / name).write_bytes(b"data")
+
+    found = sorted(os.path.relpath(path, tmp_path) for path in get_image_files(tmp_path))
+
+    assert found == ["a.JPG", "b.Png", "c.jpeg", os.path.join("nested", "d.JPEG")]
+
+
+def test_get_image_files_skips_folders_it_cannot_list(tmp_path, monkeypatch):
+    (tmp_path / "locked").mkdir()
+    (tmp_path / "locked" / "hidden.jpg").write_bytes(b"data")
+    (tmp_path / "visible.jpg").write_bytes(b"data")
+    scandir = os.scandir
+
+    def failing_scandir(path):
+        if os.path.basename(path) == "locked":
+            raise PermissionError(13, "Permission denied", path)
+        return scandir(path)
+    monkeypatch.setattr(utils.os, "scandir", failing_scandir)
+
+    found = [os.path.relpath(path, tmp_path) for path in get_image_files(tmp_path)]
+
+    assert found == ["visible.jpg"]
+
+
+BACKENDS = [
+    ImageBackend.PILLOW,
+    pytest.param(ImageBackend.VIPS, marks=pytest.mark.skipif(utils.pyvips is None, reason="pyvips is not installed")),
+    pytest.param(ImageBackend.CV2, marks=pytest.mark.skipif(utils.cv2 is None, reason="OpenCV is not installed")),
+]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_convert_file_with_each_backend(tmp_path, backend):
+    file_path = str(tmp_path / "a.png")
+    Image.new("RGBA", (300, 150), (0, 0, 255, 128)).save(file_path)
+    output_file_path = str(tmp_path / "a.webp")
+
+    original_size, converted_size, count = convert_file(file_path, output_file_path, 80, "WEBP", max_dim=100,
+                                                        backend=backend)
+
+    assert (original_size, converted_size, count) == (os.path.getsize(file_path), os.path.getsize(output_file_path), 1)
+    with Image.open(output_file_path) as converted:
+        assert converted.format == "WEBP"
+        assert converted.mode == "RGBA"
+        assert converted.size == (100, 50)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_convert_file_skips_unreadable_images_with_each_backend(tmp_path, backend):
+    file_path = str(tmp_path / "broken.jpg")
+    with open(file_path, "wb") as broken_file:
+        broken_file.write(b"not an image")
+    output_file_path = str(tmp_path / "broken.webp")
+
+    assert convert_file(file_path, output_file_path, 80, "WEBP", backend=backend) == (0, 0, 0)
+    assert not os.path.exists(output_file_path)
+
+
+@pytest.mark.parametrize("backend, module", [(ImageBackend.VIPS, "pyvips"), (ImageBackend.CV2, "cv2")])
+def test_resolve_backend_falls_back_to_pillow_when_not_installed(monkeypatch, backend, module):
+    monkeypatch.setattr(utils, module, None)
+
+    assert resolve_backend(backend) == ImageBackend.PILLOW
+    assert resolve_backend(ImageBackend.PILLOW) == ImageBackend.PILLOW
+
+
+def test_convert_file_replaces_the_output_without_leaving_a_temporary_file(tmp_path):
+    file_path = str(tmp_path / "a.png")
+    Image.new("RGB", (32, 32), "red").save(file_path)
+    output_file_path = tmp_path / "a.webp"
+    output_file_path.write_bytes(b"stale")
+
+    convert_file(file_path, str(output_file_path), 80, "WEBP")
+
+    with Image.open(output_file_path) as converted:
+        assert converted.format == "WEBP"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.png", "a.webp"]
+
+
+def test_convert_file_removes_the_temporary_file_when_the_write_fails(tmp_path):
+    file_path = str(tmp_path / "a.png")
+    Image.new("RGB", (32, 32), "red").save(file_path)
+    output_file_path = tmp_path / "a.webp"
+    output_file_path.mkdir()  # os.replace cannot overwrite a folder
+
+    with pytest.raises(OSError):
+        convert_file(file_path, str(output_file_path), 80, "WEBP")
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.png", "a.webp"]
+
+
+def test_output_path_resolver_keeps_nested_folders_and_inner_dots(tmp_path):
+    source_folder = str(tmp_path / "photos")
+    output_folder = str(tmp_path / "photos_webp")
+    resolve = output_path_resolver(source_folder, output_folder, "WEBP")
+
+    assert resolve(os.path.join(source_folder, "a", "b", "trip.2024.final.jpg")) == \
+        os.path.join(output_folder, "a", "b", "trip.2024.final.webp")
+    assert resolve(os.path.join(source_folder, "cover.PNG")) == os.path.join(output_folder, "cover.webp")
+
+
+def test_remove_folder_in_background_removes_folder(tmp_path):
+    folder = tmp_path / "old_output"
+    folder.mkdir()
+    (folder / "a.webp").write_bytes(b"data")
+
+    remove_folder_in_background(folder)
+
+    assert not folder.exists()
+
+
+def test_remove_folder_in_background_falls_back_when_rename_fails(tmp_path, monkeypatch):
+    folder = tmp_path / "old_output"
+    folder.mkdir()
+    (folder / "a.webp").write_bytes(b"data")
+
+    def failing_rename(source, destination):
+        raise OSError("cross-device link")
+    monkeypatch.setattr(utils.os, "rename", failing_rename)
+
+    remove_folder_in_background(folder)
+
+    assert not folder.exists()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_encode_with_pillow_names_the_file_it_cannot_identify(tmp_path):
+    file_path = str(tmp_path / "broken.jpg")
+    with open(file_path, "wb") as broken_file:
+        broken_file.write(b"not an image")
+
+    with pytest.raises(UnidentifiedImageError, match="broken.jpg"):
+        encode_with_pillow(file_path, 80, "WEBP", None, 0)